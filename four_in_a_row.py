@@ -1,7 +1,220 @@
 # use math library if needed
 import math
-
-def get_child_boards(player, board):
+import os
+import pickle
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+
+# size of the game board, see GUI.BOARD_HEIGHT and GUI.BOARD_WIDTH
+ROWS = 6
+COLS = 7
+
+# all 69 4-slot segments on the board as ((r0, c0), (r1, c1), (r2, c2), (r3, c3)),
+# where row 0 is the top row as in Board.get()
+SEGMENTS = tuple(
+    # row
+    tuple((r, c+i) for i in range(4)) for r in range(ROWS) for c in range(COLS-3)
+) + tuple(
+    # col
+    tuple((r+i, c) for i in range(4)) for r in range(ROWS-3) for c in range(COLS)
+) + tuple(
+    # slash
+    tuple((r-i, c+i) for i in range(4)) for r in range(3, ROWS) for c in range(COLS-3)
+) + tuple(
+    # backslash
+    tuple((r+i, c+i) for i in range(4)) for r in range(ROWS-3) for c in range(COLS-3)
+)
+
+
+def _slot_bit(r, c):
+    # the bit of the slot (r, c) in the bitboard layout of game_gui.Board
+    return 1 << (c*(ROWS+1) + ROWS-1-r)
+
+# the columns from the center outwards, the order in which the searches try
+# the moves (the center columns are part of the most segments)
+CENTER_ORDER = (3, 2, 4, 1, 5, 0, 6)
+
+# the weights of the 4-slot segments in evaluate()
+# [w0, w1, w2, w3, --w4--]
+# w0 for the case where all slots are empty in a 4-slot segment
+# w1 for the case where the player occupies one slot in a 4-slot line, the rest are empty
+# w2 for two slots occupied
+# w3 for three
+# w4 for four
+WEIGHTS = (0, 1, 4, 16, 1000)
+
+# the segments as bit masks of their 4 slots
+WIN_MASKS = tuple(sum(_slot_bit(r, c) for r, c in seg) for seg in SEGMENTS)
+
+
+def _segment_starts():
+    # group the segments by direction as (shift, starts), where shift is the
+    # bit distance between two neighboring slots of a segment and starts
+    # has the lowest bit of every segment in that direction set
+    starts = {}
+    for mask in WIN_MASKS:
+        low = mask & -mask
+        rest = mask ^ low
+        shift = (rest & -rest).bit_length() - low.bit_length()
+        starts[shift] = starts.get(shift, 0) | low
+    return tuple(sorted(starts.items()))
+
+# _evaluate_bits() puts the discs of both players side by side in one int,
+# the second player _HALF bits up, far enough that shifting a whole segment
+# (3 times the largest shift) never moves its discs onto the first player's
+_HALF = (ROWS+1)*COLS + 3*(ROWS+2)
+_LOW_HALF = (1 << _HALF) - 1
+# the segment starts by direction, for both halves
+_SEGMENT_STARTS = tuple(
+    (shift, starts | starts << _HALF) for shift, starts in _segment_starts()
+)
+
+# the score of making four in a row found by the searches, raised by the
+# remaining search depth so that faster wins score higher
+WIN_SCORE = 1000000
+
+# number of boards whose scores evaluate() keeps, about 300 bytes each
+# (about 80 MB when full, in every worker process of alphabeta too)
+EVALUATE_CACHE_SIZE = 1 << 18
+
+# the opening book maps (player to move,) + board.key() of early boards to
+# the column alphabeta picks there when searching OPENING_BOOK_DEPTH deep,
+# see build_opening_book() for how the file shipped next to this module is
+# made
+OPENING_BOOK_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "opening_book.pickle"
+)
+
+
+def _load_opening_book(path):
+    # the saved (depth_limit, opening book), or an empty book if there is
+    # no such file
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return 0, {}
+
+OPENING_BOOK_DEPTH, OPENING_BOOK = _load_opening_book(OPENING_BOOK_PATH)
+
+# flags of transposition table entries: the stored score is the exact value,
+# a lower bound or an upper bound of the board
+EXACT, LOWER, UPPER = 0, 1, 2
+# number of slots of a transposition table
+TT_SIZE = 1 << 20
+
+# transposition table of minimax and alphabeta
+# the scores are stored from the view of the player to move, so that the
+# entries stay valid whichever player the search is run for
+# every search clears it first, so the entries are only reused within one
+# search (transpositions and iterative deepening) and the moves picked do
+# not depend on earlier searches at other depths or for the other player
+TT = {}
+# transposition table of expectimax, cleared the same way
+EXPECTIMAX_TT = {}
+
+
+def _tt_key(player, board):
+    # zobrist hash of the board with the player to move
+    if player == board.PLAYER2:
+        return board.zhash ^ board.ZOBRIST_TURN
+    return board.zhash
+
+
+def _tt_lookup(table, key):
+    # return (depth, score, flag, best_move) stored for the board, or None
+    # the searches do not take a stored score for the root, which still
+    # needs a best move to play, only the best move to try first
+    entry = table.get(key & (TT_SIZE-1))
+    if entry is not None and entry[0] == key:
+        return entry[1:]
+    return None
+
+
+def _tt_store(table, key, depth, score, flag, best_move):
+    # a slot holding the same board is only replaced by a deeper search,
+    # a slot holding another board is always replaced
+    slot = key & (TT_SIZE-1)
+    entry = table.get(slot)
+    if entry is None or entry[0] != key or entry[1] <= depth:
+        table[slot] = (key, depth, score, flag, best_move)
+
+
+def _tt_flag(score, alpha, beta):
+    # the kind of bound a search result gives for the (alpha, beta) window
+    if score <= alpha:
+        return UPPER
+    if score >= beta:
+        return LOWER
+    return EXACT
+
+
+# alphabeta searches the moves at the root in parallel worker processes from
+# this depth on, shallower searches are faster than starting the workers
+PARALLEL_DEPTH = 6
+_executor = None
+
+# marks that the top frame of the alphabeta stack has to search its next
+# child, as opposed to having received the value of a child
+_EXPAND = object()
+
+
+class _Frame(object):
+    # a board being searched on the explicit stack of alphabeta
+    # the scores and the window are seen from the player to move
+    __slots__ = ("player", "own", "other", "zhash", "key", "depth_limit",
+                 "alpha", "beta", "window", "moves", "move", "score",
+                 "best_move")
+
+    def __init__(self, player, own, other, zhash, key, depth_limit,
+                 alpha, beta, window, moves):
+        # the player to move
+        self.player = player
+        # the discs of the player to move and of the player who just moved
+        self.own = own
+        self.other = other
+        # zobrist hash of the discs and transposition table key of the board
+        self.zhash = zhash
+        self.key = key
+        self.depth_limit = depth_limit
+        self.alpha = alpha
+        self.beta = beta
+        # the (alpha, beta) window the board was entered with, to flag the
+        # score in the transposition table
+        self.window = window
+        # iterator over the remaining columns to place at
+        self.moves = moves
+        # the column of the successor being searched
+        self.move = None
+        self.score = -math.inf
+        self.best_move = None
+
+
+def _ordered_columns(board, tt_move=None, skip_mirrored=True):
+    # the placeable columns, tt_move first and then the others from the
+    # center outwards, which is the order that prunes the most in alphabeta
+    # on a symmetric board the columns right of the center give the mirror
+    # images of the successors on the left, so they are skipped if asked for
+    last = board.cols - 1
+    if skip_mirrored and board.is_symmetric():
+        last = (board.cols - 1) // 2
+    placeable = board.placeable
+    cols = [c for c in CENTER_ORDER if c <= last and placeable(c)]
+    if tt_move in cols and cols[0] != tt_move:
+        cols.remove(tt_move)
+        cols.insert(0, tt_move)
+    return cols
+
+
+def _winning_move(player, board):
+    # a column where player makes four in a row right away, or None
+    for c in _ordered_columns(board):
+        if board.would_win(player, c):
+            return c
+    return None
+
+
+def get_child_boards(player, board, tt_move=None, skip_mirrored=True):
     """
     Generate a list of succesor boards obtained by placing a disc 
     at the given board for a given player
@@ -11,23 +224,63 @@ def get_child_boards(player, board):
     player: board.PLAYER1 or board.PLAYER2
         the player that will place a disc on the board
     board: the current board instance
+    tt_move: int or None
+        the best column found by a previous search of the board, if any
+    skip_mirrored: boolean
+        leave out the columns right of the center if the board is symmetric
+        (see _ordered_columns())
 
     Returns
     -------
     a list of (col, new_board) tuples,
     where col is the column in which a new disc is placed (left column has a 0 index), 
     and new_board is the resulting board instance
+    the list starts with tt_move, followed by the other columns from the
+    center outwards, which is the order that prunes the most in alphabeta
     """
     
     res = []
-    for c in range(board.cols):
-        if board.placeable(c):
-            tmp_board = board.clone()
-            tmp_board.place(player, c)
-            res.append((c, tmp_board))
+    clone, append = board.clone, res.append
+    for c in _ordered_columns(board, tt_move, skip_mirrored):
+        tmp_board = clone()
+        tmp_board.place(player, c)
+        append((c, tmp_board))
     return res
 
 
+def iter_moves(player, board, tt_move=None, skip_mirrored=True):
+    """
+    Place a disc for a given player at each placeable column of the board in
+    turn, without copying the board
+   
+    Parameters
+    ----------
+    player: board.PLAYER1 or board.PLAYER2
+        the player that will place a disc on the board
+    board: the current board instance
+    tt_move: int or None
+        the best column found by a previous search of the board, if any
+    skip_mirrored: boolean
+        leave out the columns right of the center if the board is symmetric
+        (see _ordered_columns())
+
+    Yields
+    ------
+    col: int
+        the column in which a new disc is placed (left column has a 0 index),
+        board holds the successor until the next column is requested, the
+        disc is removed again afterwards (also if the loop stops early)
+        the columns come in the same order as in get_child_boards
+    """
+    place, unplace = board.place, board.unplace
+    for c in _ordered_columns(board, tt_move, skip_mirrored):
+        place(player, c)
+        try:
+            yield c
+        finally:
+            unplace(c)
+
+
 def evaluate(player, board):
     """
     This is a function to evaluate the advantage of the specific player at the
@@ -45,63 +298,65 @@ def evaluate(player, board):
         a scalar to evaluate the advantage of the specific player at the given
         game board
     """
-    adversary = board.PLAYER2 if player == board.PLAYER1 else board.PLAYER1
-    # Initialize the value of scores
-    # [s0, s1, s2, s3, --s4--]
-    # s0 for the case where all slots are empty in a 4-slot segment
-    # s1 for the case where the player occupies one slot in a 4-slot line, the rest are empty
-    # s2 for two slots occupied
-    # s3 for three
-    # s4 for four
-    score = [0]*5
-    adv_score = [0]*5
-
-    # Initialize the weights
-    # [w0, w1, w2, w3, --w4--]
-    # w0 for s0, w1 for s1, w2 for s2, w3 for s3
-    # w4 for s4
-    weights = [0, 1, 4, 16, 1000]
-
-    # Obtain all 4-slot segments on the board
-    seg = []
-    invalid_slot = -1
-    left_revolved = [
-        [invalid_slot]*r + board.row(r) + \
-        [invalid_slot]*(board.rows-1-r) for r in range(board.rows)
-    ]
-    right_revolved = [
-        [invalid_slot]*(board.rows-1-r) + board.row(r) + \
-        [invalid_slot]*r for r in range(board.rows)
-    ]
-    for r in range(board.rows):
-        # row
-        row = board.row(r) 
-        for c in range(board.cols-3):
-            seg.append(row[c:c+4])
-    for c in range(board.cols):
-        # col
-        col = board.col(c) 
-        for r in range(board.rows-3):
-            seg.append(col[r:r+4])
-    for c in zip(*left_revolved):
-        # slash
-        for r in range(board.rows-3):
-            seg.append(c[r:r+4])
-    for c in zip(*right_revolved): 
-        # backslash
-        for r in range(board.rows-3):
-            seg.append(c[r:r+4])
-    # compute score
-    for s in seg:
-        if invalid_slot in s:
-            continue
-        if adversary not in s:
-            score[s.count(player)] += 1
-        if player not in s:
-            adv_score[s.count(adversary)] += 1
-    reward = sum([s*w for s, w in zip(score, weights)])
-    penalty = sum([s*w for s, w in zip(adv_score, weights)])
-    return reward - penalty
+    return _evaluate_board(player, board)[0]
+
+
+def _evaluate_board(player, board):
+    # (evaluate(player, board), whether a side has four in a row)
+    if player == board.PLAYER1:
+        return _evaluate_bits(board.bb_p1, board.bb_p2)
+    return _evaluate_bits(board.bb_p2, board.bb_p1)
+
+
+@lru_cache(maxsize=EVALUATE_CACHE_SIZE)
+def _evaluate_bits(bb_player, bb_adversary):
+    # evaluate() on the bitboards of the player and the adversary
+    # it only works on ints and module constants, so nothing is looked up
+    # on the board instance, and the scores are cached since the same
+    # leaves are reached by different move orders
+    # Return (score, won), where won tells if a side has four in a row,
+    # which falls out of the segment counts for free
+
+    # the weights of the segments holding 1, 2, 3 and 4 discs of one side
+    w1, w2, w3, w4 = WEIGHTS[1:]
+    half, low_half = _HALF, _LOW_HALF
+    score = 0
+    won = 0
+
+    # compute score over all 4-slot segments on the board
+    # the segments of one direction are all scored at once with bitwise ops:
+    # the slots of every segment are shifted onto its lowest slot and added
+    # up bit by bit, for the player in the low half and the adversary in the
+    # high half; a segment only counts for a side if the other side has no
+    # disc in it (w0 is zero, thus empty segments are not counted)
+    own = bb_player | bb_adversary << half
+    other = bb_adversary | bb_player << half
+    for shift, starts in _SEGMENT_STARTS:
+        shift2 = shift + shift
+        own1 = own >> shift
+        own2 = own >> shift2
+        own3 = own1 >> shift2
+        free = starts & ~(other | other >> shift | other >> shift2 | other >> shift2 >> shift)
+        # a half adder for each pair of slots, then for the two sums: the
+        # number of discs is ones + 2*twos, or 4 where fours is set
+        sum1, carry1 = own ^ own1, own & own1
+        sum2, carry2 = own2 ^ own3, own2 & own3
+        ones, carry3 = sum1 ^ sum2, sum1 & sum2
+        twos = carry1 ^ carry2 ^ carry3
+        fours = free & (carry1 & carry2 | carry3 & (carry1 | carry2))
+        won |= fours
+        ones &= free
+        s1 = ones & ~twos
+        s2 = free & twos & ~ones
+        s3 = ones & twos
+        # reward of the player minus penalty of the adversary
+        score += (
+            w1 * ((s1 & low_half).bit_count() - (s1 >> half).bit_count()) +
+            w2 * ((s2 & low_half).bit_count() - (s2 >> half).bit_count()) +
+            w3 * ((s3 & low_half).bit_count() - (s3 >> half).bit_count()) +
+            w4 * ((fours & low_half).bit_count() - (fours >> half).bit_count())
+        )
+    return score, won != 0
 
 
 def minimax(player, board, depth_limit):
@@ -115,7 +370,6 @@ def minimax(player, board, depth_limit):
     board: the current game board instance
     depth_limit: int
         the tree depth that the search algorithm needs to go further before stopping
-    max_player: boolean
 
     Returns
     -------
@@ -124,64 +378,241 @@ def minimax(player, board, depth_limit):
         (counted from the most left as 0)
         None to give up the game
     """
-    max_player = player
+    max_depth = depth_limit
     placement = None
 
 ### Please finish the code below ##############################################
 ###############################################################################
+    TT.clear()
+
     def value(player, board, depth_limit):
+        # Negamax: return the value of the board for the player to move,
+        # which is the best of the negated values of the successors for
+        # the other player (evaluate() of the other player is the negated
+        # evaluate() of the player)
+        # This is a column to place
+        nonlocal placement
         # return the evaluated value if the depth limit is 0
         # or the board shows the end (draw or someone wins)
         if (depth_limit == 0 or board.terminal()):
-            return evaluate(max_player, board)
-        # if the player is max, run the function for a max player
-        if (player == max_player):
-            return max_value(player, board, depth_limit)
-        # if the player is min, run the function for a min player
-        else:
-            return min_value(player, board, depth_limit)
-
-    def max_value(player, board, depth_limit):
-        # This is a column to place
-        nonlocal placement
-        # This is a score for a max player
-        nonlocal score
+            return evaluate(player, board)
+        # Reuse the score of the board if it was already searched deep enough
+        # (not at the root, see _tt_lookup())
+        key = _tt_key(player, board)
+        entry = _tt_lookup(TT, key)
+        best_move = None
+        if entry is not None:
+            depth, val, flag, best_move = entry
+            if depth >= depth_limit and flag == EXACT and depth_limit < max_depth:
+                return val
+        if (depth_limit == 1):
+            # The successors are leaves, which are all evaluated anyway,
+            # and the evaluation of a successor also tells if the move
+            # makes four in a row, so there is no separate check for a win
+            return leaf_value(player, board, key, best_move)
+        # Win right away instead of searching the moves
+        # if a move makes four in a row
+        c = _winning_move(player, board)
+        if c is not None:
+            if (depth_limit == max_depth):
+                placement = c
+            score = WIN_SCORE + depth_limit
+            _tt_store(TT, key, depth_limit, score, EXACT, c)
+            return score
+        other_player = board.PLAYER2 if player == board.PLAYER1 else board.PLAYER1
         score = -math.inf
         # Check every possible move
-        for successor in get_child_boards(player, board):
+        for c in iter_moves(player, board, best_move):
             # This allows to check with specified depth
-            val = value(next_player, successor[1], depth_limit - 1)
-            # Max player wants to maximize scores
+            val = -value(other_player, board, depth_limit - 1)
+            # The player wants to maximize its scores
             # Thus, check if the previous value is bigger than current value
             if (score < val):
                 score = val
-                placement = successor[0]
+                best_move = c
+        if (depth_limit == max_depth):
+            placement = best_move
+        _tt_store(TT, key, depth_limit, score, EXACT, best_move)
         return score
-    
-    def min_value(player, board, depth_limit):
+
+    def leaf_value(player, board, key, best_move):
+        # value() of a board with the depth limit 1
         nonlocal placement
-        nonlocal score
-        score = math.inf
-        for successor in get_child_boards(player, board):
-            val = value(next_player, successor[1], depth_limit - 1)
-            # Min player wants to minimize scores
-            # Thus, check if the previous value is smaller than current value
-            if (score > val):
+        score = -math.inf
+        moves = iter_moves(player, board, best_move)
+        for c in moves:
+            val, won = _evaluate_board(player, board)
+            # Only the player can have made four in a row, since the board
+            # was not terminal before the move
+            if won:
+                score = WIN_SCORE + 1
+                best_move = c
+                # close the generator to take the disc off the board now,
+                # rather than whenever the generator gets collected
+                moves.close()
+                break
+            if (score < val):
                 score = val
-                placement = successor[0]
+                best_move = c
+        if (max_depth == 1):
+            placement = best_move
+        _tt_store(TT, key, 1, score, EXACT, best_move)
         return score
 
-    next_player = board.PLAYER2 if player == board.PLAYER1 else board.PLAYER1
-    score = -math.inf
-    score = value(player, board, depth_limit)
+    value(player, board, depth_limit)
 ###############################################################################
     return placement
 
 
+def _ab_search(player, board, max_depth):
+    # Alpha-beta search of the board to max_depth for alphabeta(), in the
+    # negamax form: every score is seen from the player to move, so the
+    # value of a board is the best of the negated values of its successors,
+    # which are searched with the negated window (-beta, -alpha).
+    # The tree is searched with an explicit stack of frames instead of
+    # recursive calls, and only on the bitboards: successors are made with
+    # int operations on the layout masks of the board instead of clone() and
+    # place(), so no board instance is created below the root.
+    # Return (score, best_move) of the root.
+    bottom, column, full = board.bottom, board.column, board.full
+    connected, symmetric = board.connected, board.symmetric
+    last_unmirrored = (board.cols - 1) // 2
+    zobrist, turn_key = board.ZOBRIST, board.ZOBRIST_TURN
+    player1, player2 = board.PLAYER1, board.PLAYER2
+    # module globals used at every node, looked up once as locals
+    evaluate_bits, tt_lookup, tt_store, tt_flag = (
+        _evaluate_bits, _tt_lookup, _tt_store, _tt_flag)
+    table, frame_type, expand, center_order = TT, _Frame, _EXPAND, CENTER_ORDER
+    if player == board.PLAYER1:
+        own, other = board.bb_p1, board.bb_p2
+    else:
+        own, other = board.bb_p2, board.bb_p1
+    stack = []
+    push, pop = stack.append, stack.pop
+    # The next board to enter as (player, own, other, zhash, depth_limit,
+    # alpha, beta), where own are the discs of the player to move and other
+    # are the discs of the player who just moved
+    node = (player, own, other, board.zhash, max_depth, -math.inf, math.inf)
+    while True:
+        if node is not None:
+            node_player, own, other, zhash, depth_limit, alpha, beta = node
+            node = None
+            val = expand
+            mask = own | other
+            # evaluate the board if the depth limit is 0
+            # or the board shows the end (draw or the last move wins)
+            if (depth_limit == 0 or mask == full or connected(other)):
+                val = evaluate_bits(own, other)[0]
+            else:
+                # Narrow the window with the bound stored for the board
+                # (not at the root, see _tt_lookup())
+                key = zhash ^ turn_key if node_player == player2 else zhash
+                entry = tt_lookup(table, key)
+                best_move = None
+                window = (alpha, beta)
+                if entry is not None:
+                    depth, tt_val, flag, best_move = entry
+                    if depth >= depth_limit and depth_limit < max_depth:
+                        if flag == EXACT:
+                            val = tt_val
+                        elif flag == LOWER:
+                            alpha = max(alpha, tt_val)
+                        else:
+                            beta = min(beta, tt_val)
+                        if (beta <= alpha):
+                            val = tt_val
+                if val is expand:
+                    # placeable columns, the best move of a previous search
+                    # first and the others from the center outwards
+                    moves = [c for c in center_order if mask & column[c] != column[c]]
+                    # skip the mirrored columns, see _ordered_columns()
+                    if symmetric(mask) and symmetric(own):
+                        moves = [c for c in moves if c <= last_unmirrored]
+                    # Win right away instead of searching the moves
+                    # if a move makes four in a row
+                    for c in moves:
+                        if connected(own | ((mask + bottom[c]) & column[c])):
+                            val = WIN_SCORE + depth_limit
+                            tt_store(table, key, depth_limit, val, EXACT, c)
+                            if not stack:
+                                return val, c
+                            break
+                    else:
+                        if best_move in moves:
+                            moves.remove(best_move)
+                            moves.insert(0, best_move)
+                        push(frame_type(
+                            node_player, own, other, zhash, key,
+                            depth_limit, alpha, beta, window, iter(moves)
+                        ))
+
+        if val is not expand:
+            if not stack:
+                return val, None
+            # Fold the value of the child into its parent, the parent
+            # wants to maximize the negated score of the child (fail-soft:
+            # the score may lie outside the window of the parent)
+            frame = stack[-1]
+            val = -val
+            if (frame.score < val):
+                frame.score = val
+                frame.best_move = frame.move
+                frame.alpha = max(frame.alpha, val)
+
+        frame = stack[-1]
+        # Stop checking other child boards if beta <= alpha
+        c = next(frame.moves, None) if frame.alpha < frame.beta else None
+        if c is None:
+            pop()
+            tt_store(table, frame.key, frame.depth_limit, frame.score,
+                     tt_flag(frame.score, *frame.window), frame.best_move)
+            if not stack:
+                return frame.score, frame.best_move
+            val = frame.score
+            continue
+        # Check the next child board with the specified depth
+        # and the negated window;
+        # adding the bottom bit carries up to the lowest empty slot
+        frame.move = c
+        move = ((frame.own | frame.other) + bottom[c]) & column[c]
+        node = (
+            player2 if frame.player == player1 else player1,
+            frame.other, frame.own | move,
+            frame.zhash ^ zobrist[move.bit_length()-1][frame.player-1],
+            frame.depth_limit - 1, -frame.beta, -frame.alpha
+        )
+
+
+def _ab_subtree(player, board, depth_limit):
+    # The score of a board searched by alphabeta() to depth_limit for the
+    # player to move, run in a worker process for a move at the root
+    TT.clear()
+    # The shallower searches only fill the transposition table for move
+    # ordering; there is no early stop on a forced win, since the root
+    # compares the scores of all its moves and a win found with more depth
+    # left (a faster win) only scores higher if every move was searched to
+    # the same depth
+    for max_depth in range(1, depth_limit + 1):
+        score, _ = _ab_search(player, board, max_depth)
+    return score
+
+
+def _get_executor():
+    # the worker processes for alphabeta(), started on the first use
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=os.cpu_count())
+    return _executor
+
+
 def alphabeta(player, board, depth_limit):
     """
     Minimax algorithm with alpha-beta pruning.
 
+    From depth_limit OPENING_BOOK_DEPTH on, the early boards are looked up
+    in the opening book instead, which gives the column searched to
+    OPENING_BOOK_DEPTH.
+
      Parameters
     ----------
     player: board.PLAYER1 or board.PLAYER2
@@ -189,10 +620,6 @@ def alphabeta(player, board, depth_limit):
     board: the current game board instance
     depth_limit: int
         the tree depth that the search algorithm needs to go further before stopping
-    alpha: float
-    beta: float
-    max_player: boolean
-
 
     Returns
     -------
@@ -201,72 +628,45 @@ def alphabeta(player, board, depth_limit):
         (counted from the most left as 0)
         None to give up the game
     """
-    max_player = player
-    placement = None
 
 ### Please finish the code below ##############################################
 ###############################################################################
-    def value(player, board, depth_limit):
-        # return the evaluated value if the depth limit is 0
-        # or the board shows the end (draw or someone wins)
-        if (depth_limit == 0 or board.terminal()):
-            return evaluate(player, board)
-        # if the player is max, run the function for a max player
-        if (next_player == max_player):
-            return max_value(player, board, depth_limit)
-        # if the player is min, run the function for a min player
-        else:
-            return min_value(player, board, depth_limit)
-
-    def max_value(player, board, depth_limit):
-        # This is a column to place
-        nonlocal placement
-        # This is a score for a max player
-        nonlocal score
-        nonlocal alpha, beta
+    # Take the column from the opening book if the board is in there,
+    # unless the book was searched less deep than asked for
+    placement = (OPENING_BOOK.get((player,) + board.key())
+                 if depth_limit >= OPENING_BOOK_DEPTH else None)
+    if placement is not None:
+        return placement
+    TT.clear()
+    next_player = board.PLAYER2 if player == board.PLAYER1 else board.PLAYER1
+    if (depth_limit >= PARALLEL_DEPTH):
+        # Win right away if a move makes four in a row
+        placement = _winning_move(player, board)
+        if placement is not None:
+            return placement
+        # Search every move at the root in a worker process,
+        # the moves do not depend on each other without a shared window
+        futures = [
+            (successor[0], _get_executor().submit(
+                _ab_subtree, next_player, successor[1], depth_limit - 1
+            ))
+            for successor in get_child_boards(player, board)
+        ]
         score = -math.inf
-        # Check every possible move
-        for successor in get_child_boards(player, board):
-            # This allows to check with the specified depth
-            val = value(player, successor[1], depth_limit - 1)
-            # Max player wants to maximize scores
-            # Thus, check if the previous value is bigger than current value
+        for c, future in futures:
+            # the scores of the workers are seen from the next player
+            val = -future.result()
             if (score < val):
                 score = val
-                placement = successor[0]
-                alpha = max(alpha, score)
-            # Stop checking other child boards if beta <= alpha
-            if (beta <= alpha):
-                break
-        return score
-    
-    def min_value(player, board, depth_limit):
-        # This is a column to place
-        nonlocal placement
-        # This is a score for a max player
-        nonlocal score
-        nonlocal alpha, beta
-        score = math.inf
-        # Check every possible move
-        for successor in get_child_boards(player, board):
-            # This allows to check with the specified depth
-            val = value(player, successor[1], depth_limit - 1)
-            # Min player wants to minimize scores
-            # Thus, check if the previous value is smaller than current value
-            if (score > val):
-                score = val
-                placement = successor[0]
-                beta = min(beta, score)
-            # Stop checking other child boards if beta <= alpha
-            if (beta <= alpha):
+                placement = c
+    else:
+        # Iterative deepening: every search leaves its best moves in the
+        # transposition table, which the next deeper search tries first
+        for max_depth in range(1, depth_limit + 1):
+            score, placement = _ab_search(player, board, max_depth)
+            # Stop early if a win is already forced
+            if (score >= WIN_SCORE):
                 break
-        return score
-
-    next_player = board.PLAYER2 if player == board.PLAYER1 else board.PLAYER1
-    score = -math.inf
-    alpha = -math.inf
-    beta = math.inf
-    score = value(player, board, depth_limit)
 ###############################################################################
     return placement
 
@@ -297,7 +697,10 @@ def expectimax(player, board, depth_limit):
         None to give up the game
     """
     max_player = player
+    max_depth = depth_limit
     placement = None
+    table = EXPECTIMAX_TT
+    table.clear()
 
 ### Please finish the code below ##############################################
 ###############################################################################
@@ -305,7 +708,7 @@ def expectimax(player, board, depth_limit):
         # return the evaluated value if the depth limit is 0
         # or the board shows the end (draw or someone wins)
         if (depth_limit == 0 or board.terminal()):
-            return evaluate(player, board)
+            return evaluate(max_player, board)
         # if the player is max, run the function for a max player
         if (player == max_player):
             return max_value(player, board, depth_limit)
@@ -316,48 +719,106 @@ def expectimax(player, board, depth_limit):
     def max_value(player, board, depth_limit):
         # This is a column to place
         nonlocal placement
+        # Reuse the score of the board if it was already searched deep enough
+        # (not at the root, see _tt_lookup())
+        key = _tt_key(player, board)
+        entry = _tt_lookup(table, key)
+        best_move = None
+        if entry is not None:
+            depth, val, flag, best_move = entry
+            if depth >= depth_limit and depth_limit < max_depth:
+                return val
         # This is a score for a max player
-        nonlocal score
+        score = -math.inf
         # Check every possible move
-        for successor in get_child_boards(player, board):
+        for c in iter_moves(player, board, best_move):
             # This allows to check values with specified depth
-            val = value(next_player, successor[1], depth_limit - 1)
+            val = value(next_player, board, depth_limit - 1)
             # Max player wants to maximize scores
             # Thus, check if the previous value is bigger than current value
             if (score < val):
                 score = val
-                placement = successor[0]
+                best_move = c
+        if (depth_limit == max_depth):
+            placement = best_move
+        _tt_store(table, key, depth_limit, score, EXACT, best_move)
         return score
 
     def min_value(player, board, depth_limit):
-        # This is a column to place
-        nonlocal placement
-        # This is a score for a max player
-        nonlocal score
-        # For expectimax with expected utility, we set initial score to zero
-        score = 0
-        # Check every possible move
-        for successor in get_child_boards(player, board):
-            #p = probability(successor)
-            #score += p * value(next_player, successor[1], depth_limit - 1)
+        key = _tt_key(player, board)
+        entry = _tt_lookup(table, key)
+        if entry is not None and entry[0] >= depth_limit:
+            return entry[1]
+        # The adversary picks one of the placeable columns uniformly at
+        # random, so the score is the mean value of the successors
+        # (including the mirrored ones, which count as moves of their own)
+        moves = iter_moves(player, board, skip_mirrored=False)
+        if (depth_limit == 1):
+            # The successors are leaves, evaluate them all at once
+            values = [evaluate(max_player, board) for _ in moves]
+        else:
             # This allows to check values with specified depth
-            val = value(next_player, successor[1], depth_limit - 1)
-            # The value for probability is set to 1 / 7
-            # because we always choose one from 7 options (columns) for a placement
-            score += (1 / 7) * val
-            # This takes values with higher probability
-            if (score < val):
-                score = val
-                placement = successor[0]
+            values = [value(max_player, board, depth_limit - 1) for _ in moves]
+        score = sum(values) / len(values)
+        _tt_store(table, key, depth_limit, score, EXACT, None)
         return score
 
     next_player = board.PLAYER2 if player == board.PLAYER1 else board.PLAYER1
-    score = -math.inf
-    score = value(player, board, depth_limit)
+    value(player, board, depth_limit)
 ###############################################################################
     return placement
 
 
+def build_opening_book(max_discs=4, depth_limit=8, path=OPENING_BOOK_PATH):
+    """
+    Search every board that can be reached with fewer than max_discs discs
+    (player 1 placing first) with alphabeta, and save the picked columns as
+    the opening book that alphabeta looks up before searching.
+
+    The book in the repository was made with the defaults (295 boards, one
+    to two minutes on one core), rebuild it after changing the search or the
+    evaluation:
+
+        python -c 'import four_in_a_row; four_in_a_row.build_opening_book()'
+
+    Parameters
+    ----------
+    max_discs: int
+        the boards with up to max_discs-1 discs are put in the book
+    depth_limit: int
+        the depth of the search for every board in the book
+    path: str
+        the file to save the book to
+
+    Returns
+    -------
+    book: dict
+        the opening book, which also replaces OPENING_BOOK
+    """
+    global OPENING_BOOK_DEPTH
+    from game_gui import Board
+
+    # Search from scratch rather than look up the old book
+    OPENING_BOOK.clear()
+    book = {}
+    player = Board.PLAYER1
+    boards = [Board(ROWS, COLS)]
+    for _ in range(max_discs):
+        successors = {}
+        for board in boards:
+            book[(player,) + board.key()] = alphabeta(player, board, depth_limit)
+            for c, child in get_child_boards(player, board, skip_mirrored=False):
+                if not child.terminal():
+                    successors[child.key()] = child
+        boards = list(successors.values())
+        player = Board.PLAYER2 if player == Board.PLAYER1 else Board.PLAYER1
+    with open(path, "wb") as f:
+        pickle.dump((depth_limit, book), f)
+    OPENING_BOOK.update(book)
+    OPENING_BOOK_DEPTH = depth_limit
+    return book
+
+
 if __name__ == "__main__":
     from game_gui import GUI
     import tkinter
@@ -2,9 +2,24 @@ import random, time
 import tkinter as tk
 import math
 
+# random numbers for the zobrist keys of Board, drawn from a fixed seed so that
+# every process hashes the boards the same way
+_zobrist_rng = random.Random(3401)
+
 class Board(object):
     # The Board() class simulates the game board.
+    #
+    # The slots are stored as two bitboards (python ints), one per player.
+    # Every column takes rows+1 bits, counted from the bottom slot upwards;
+    # the extra bit on top of each column always stays empty so that the
+    # four-in-a-row shifts in connected() never wrap into the next column.
+    # i.e. the slot at height h (0 for the bottom) of column c is the bit
+    # c*(rows+1) + h.
     
+    # fixed attributes, no per-instance __dict__ (boards are cloned a lot)
+    __slots__ = ("rows", "cols", "bottom", "column", "full",
+                 "bb_p1", "bb_p2", "zhash")
+
     # an integer flag to represent an empty slot in the board
     EMPTY_SLOT = 0
     # an integer flag to represent the player 1
@@ -12,17 +27,40 @@ class Board(object):
     # an integer flag to represent the player 2
     PLAYER2 = 2
 
+    # zobrist keys of a disc of player 1 and player 2 at each bit of the
+    # bitboards (enough for boards with (rows+1)*cols <= 64)
+    ZOBRIST = [[_zobrist_rng.getrandbits(64) for _ in range(2)] for _ in range(64)]
+    # zobrist key xor-ed in when it is the turn for player 2
+    ZOBRIST_TURN = _zobrist_rng.getrandbits(64)
+
     def __init__(self, rows, cols):
-        self._board = [
-            [self.EMPTY_SLOT]*cols for _ in range(rows)
-        ]
         # number of rows of the game board
         self.rows = rows
         # number of columns of the game board
         self.cols = cols
+        # the bottom slot and all the slots of each column, and all the slots
+        # of the board as bit masks (public for searches on the bitboards)
+        stride = rows + 1
+        self.bottom = tuple(1 << (c*stride) for c in range(cols))
+        self.column = tuple(((1 << rows) - 1) << (c*stride) for c in range(cols))
+        self.full = sum(self.column)
+        # the discs of player 1 and player 2
+        self.bb_p1 = 0
+        self.bb_p2 = 0
+        # zobrist hash of the discs on the board
+        self.zhash = 0
+
+    def _bit(self, row, col):
+        # the bit of the slot at the given row (0 for the top row) and column
+        return 1 << (col*(self.rows+1) + self.rows-1-row)
     
     def __getitem__(self, key):
-        return self._board[key[0]][key[1]]
+        bit = self._bit(key[0], key[1])
+        if self.bb_p1 & bit:
+            return self.PLAYER1
+        if self.bb_p2 & bit:
+            return self.PLAYER2
+        return self.EMPTY_SLOT
     
     def get(self, row, col=None):
         # get the player occupying the given slot
@@ -34,47 +72,88 @@ class Board(object):
     
     def placeable(self, col):
         # check if a disc can be placed at the specific column
-        return self._board[0][col] == self.EMPTY_SLOT
+        column = self.column[col]
+        return (self.bb_p1 | self.bb_p2) & column != column
 
     def place(self, player, col):
         # place a disc at the specific column for player
         # raise ValueError if the specific column does not have available space
         assert(player == self.PLAYER1 or player == self.PLAYER2)
-        for r in reversed(self._board):
-            if r[col] == self.EMPTY_SLOT:
-                r[col] = player
-                return True
+        column = self.column[col]
+        mask = self.bb_p1 | self.bb_p2
+        if mask & column != column:
+            # adding the bottom bit carries up to the lowest empty slot
+            move = (mask + self.bottom[col]) & column
+            if player == self.PLAYER1:
+                self.bb_p1 |= move
+            else:
+                self.bb_p2 |= move
+            self.zhash ^= self.ZOBRIST[move.bit_length()-1][player-1]
+            return True
         raise ValueError("Column {} is not placeable.".format(col))
 
+    def unplace(self, col):
+        # remove the top disc of the specific column, undoing place()
+        # raise ValueError if the specific column is empty
+        discs = (self.bb_p1 | self.bb_p2) & self.column[col]
+        if discs:
+            top = 1 << (discs.bit_length()-1)
+            if self.bb_p1 & top:
+                self.bb_p1 ^= top
+                player = self.PLAYER1
+            else:
+                self.bb_p2 ^= top
+                player = self.PLAYER2
+            self.zhash ^= self.ZOBRIST[top.bit_length()-1][player-1]
+            return True
+        raise ValueError("Column {} is empty.".format(col))
+
+    def symmetric(self, bb):
+        # check if the given bitboard is the same when mirrored left to right
+        stride = self.rows + 1
+        for c in range(self.cols // 2):
+            right = self.cols - 1 - c
+            if (bb & self.column[c]) << ((right-c)*stride) != bb & self.column[right]:
+                return False
+        return True
+
+    def is_symmetric(self):
+        # check if the board is the same when mirrored left to right
+        return self.symmetric(self.bb_p1 | self.bb_p2) and self.symmetric(self.bb_p1)
+
+    def would_win(self, player, col):
+        # check if placing a disc at the specific (placeable) column makes
+        # four in a row for player, without placing it
+        mask = self.bb_p1 | self.bb_p2
+        move = (mask + self.bottom[col]) & self.column[col]
+        return self.connected((self.bb_p1 if player == self.PLAYER1 else self.bb_p2) | move)
+
     def has_draw(self):
         # check if the game is a draw
-        for r in self._board:
-            for c in r:
-                if c == self.EMPTY_SLOT:
-                    return False
-        return True
+        return (self.bb_p1 | self.bb_p2) == self.full
+
+    def connected(self, bb):
+        # check if there are four discs in a row in the given bitboard
+        # each m marks the discs that have a neighbor at the given shift
+        # (vertical, horizontal, and the two diagonals), and a pair of m two
+        # shifts apart makes four in a row; all directions are or-ed together
+        # instead of testing them one by one
+        s = self.rows + 1
+        m1 = bb & (bb >> 1)
+        m2 = bb & (bb >> s)
+        m3 = bb & (bb >> (s-1))
+        m4 = bb & (bb >> (s+1))
+        return (
+            m1 & (m1 >> 2) | m2 & (m2 >> 2*s) |
+            m3 & (m3 >> 2*(s-1)) | m4 & (m4 >> 2*(s+1))
+        ) != 0
     
     def who_wins(self):
         # return the winner of the game or None if there is no winner yet 
-        rows = list(map(lambda r: "".join(map(str, r)), self._board))
-        cols = list(map(lambda c: "".join(map(str, c)), zip(*self._board)))
-        left_revolved = [
-            [self.EMPTY_SLOT]*r+self._board[r]+[self.EMPTY_SLOT]*(self.rows-1-r) for r in range(self.rows)
-        ]
-        left_diag = list(map(lambda d: "".join(map(str, d)), zip(*left_revolved)))
-        right_revolved = [
-            [self.EMPTY_SLOT]*(self.rows-1-r)+self._board[r]+[self.EMPTY_SLOT]*r for r in range(self.rows)
-        ]
-        right_diag = list(map(lambda d: "".join(map(str, d)), zip(*right_revolved)))
-        seg = rows + cols + left_diag + right_diag
-        p1 = "".join(map(str, [self.PLAYER1]*4))
-        for s in seg:
-            if p1 in s:
-                return self.PLAYER1
-        p2 = "".join(map(str, [self.PLAYER2]*4))
-        for s in seg:
-            if p2 in s:
-                return self.PLAYER2
+        if self.connected(self.bb_p1):
+            return self.PLAYER1
+        if self.connected(self.bb_p2):
+            return self.PLAYER2
         return None
 
     def terminal(self):
@@ -82,21 +161,34 @@ class Board(object):
         return self.has_draw() or self.who_wins() is not None
     
     def clone(self):
-        b = Board(self.rows, self.cols)
-        b._board = [[c for c in r] for r in self._board]
+        b = Board.__new__(Board)
+        b.rows = self.rows
+        b.cols = self.cols
+        # the masks are immutable tuples and ints, so they can be shared
+        b.bottom = self.bottom
+        b.column = self.column
+        b.full = self.full
+        b.bb_p1 = self.bb_p1
+        b.bb_p2 = self.bb_p2
+        b.zhash = self.zhash
         return b
+
+    def key(self):
+        # the discs on the board as an immutable, hashable tuple of ints
+        # (bb_p1, bb_p2), which stays valid after the board is changed
+        return (self.bb_p1, self.bb_p2)
     
     def row(self, r):
         # get the specific row of the game described using PLAYER1, PLAYER2 and EMPTY_SLOT
-        return [e for e in self._board[r]]
+        return [self.__getitem__((r, c)) for c in range(self.cols)]
     
     def col(self, c):
         # get a specific column of the game board
-        return [self._board[r][c] for r in range(self.rows)]
+        return [self.__getitem__((r, c)) for r in range(self.rows)]
 
     def dump(self, indent=0):
         # a string to describe the game board using PLAYER1, PLAYER2 and EMPTY_SLOT
-        return "\n".join([" "*indent + "{}".format(r) for r in self._board])
+        return "\n".join([" "*indent + "{}".format(self.row(r)) for r in range(self.rows)])
     
     def __str__(self):
         return self.dump()